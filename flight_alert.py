@@ -1,18 +1,77 @@
+import argparse
+import cProfile
 import json
 import os
+import threading
 import time
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime # 用于获取当前时间
+from flight_alert_cache import (AlertCache, subscription_key, ALERT_CACHE_FILE_NAME, DEFAULT_ALERT_TTL,
+                                DEFAULT_ALERT_COOLDOWN, COOLDOWN, DUPLICATE)
+from flight_logging import setup_logging
+from flight_routes import parse_airports, route_pairs, route_url, format_route, extract_prices, cheapest_by_date
 
 # --- WxPusher 配置 ---
 # 从环境变量读取敏感信息
 WXPUSHER_TOKEN = os.getenv("WXPUSHER_TOKEN")
 WXPUSHER_UID = os.getenv("WXPUSHER_UID")
 
-# 配置日志记录
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# 日志记录器，在 __main__ 中通过 setup_logging 配置输出
 logger = logging.getLogger('monitor')
+LOG_DIR_NAME = "logs"
+
+# 并行请求航线数据的最大线程数
+MAX_FETCH_WORKERS = 8
+
+# --- 性能分析配置 ---
+# 设置环境变量 FLIGHT_ALERT_PROFILE=1（或命令行参数 --profile）开启阶段追踪，
+# 设置为 cprofile（或 --cprofile）时额外输出 cProfile 统计数据
+PROFILE_ENV = "FLIGHT_ALERT_PROFILE"
+PROFILE_DIR_NAME = "profiles"
+
+
+class SweepTracer:
+    """记录一次价格检查中各阶段的耗时，并导出为 Chrome trace-event JSON"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.events = []
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+
+    @contextmanager
+    def span(self, name, **args):
+        """追踪一个阶段；未开启时不做任何记录"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.events.append({
+                "name": name,
+                "cat": "sweep",
+                "ph": "X",  # 完整事件：包含开始时间和持续时间
+                "ts": (start - self._origin) * 1e6,  # 单位：微秒
+                "dur": (end - start) * 1e6,
+                "pid": self._pid,
+                "tid": threading.get_ident(),
+                "args": args,
+            })
+
+    def dump(self, path):
+        """写出追踪文件，可在 chrome://tracing 或 Perfetto 中打开"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+
+# 全局追踪器，默认关闭；在 __main__ 中根据参数开启
+tracer = SweepTracer()
 
 # WxPusher 通知函数
 def notify_user(contents, summarys):
@@ -34,41 +93,70 @@ def notify_user(contents, summarys):
         "url": "" # 可选，点击消息跳转的 URL
     }
     try:
-        response = requests.post(url=url, headers=headers, json=datas, timeout=10) # 添加超时
+        with tracer.span("notify", summary=summarys):
+            response = requests.post(url=url, headers=headers, json=datas, timeout=10) # 添加超时
         response.raise_for_status() # 检查 HTTP 错误状态
         response_json = response.json()
 
-        # 清理内容中的换行符以便于日志记录
-        cleaned_contents = contents.replace('\n', ' ')
+        # 通知内容作为结构化字段记录，换行符由 JSON 转义，无需额外处理
         if response_json.get("code") == 1000:
-            logger.info(f"WxPusher 通知发送成功: {summarys}")
-            logger.info(f"WxPusher 通知内容: {cleaned_contents}")
+            logger.info("WxPusher 通知发送成功: %s", summarys, extra={"content": contents})
         else:
-            logger.error(f"WxPusher 通知发送失败: API返回错误 {response_json}")
-            logger.error(f"失败的通知内容: {cleaned_contents}")
+            logger.error("WxPusher 通知发送失败: API返回错误 %s", response_json, extra={"content": contents})
         return response_json
     except requests.exceptions.RequestException as e:
-        logger.error(f"WxPusher 通知发送请求失败: {str(e)}")
+        logger.error("WxPusher 通知发送请求失败: %s", e)
         return None
     except Exception as e:
-        logger.error(f"WxPusher 通知处理失败: {str(e)}")
+        logger.error("WxPusher 通知处理失败: %s", e)
         return None
 
+# 经过去重缓存检查后发送通知，返回是否应更新上次记录价格
+def dispatch_alert(alert_cache, subscription, price, price_step, contents, summarys):
+    if not WXPUSHER_TOKEN or not WXPUSHER_UID:
+        # 未配置推送时照常记录价格，只是不发送通知
+        logger.warning("WxPusher TOKEN 或 UID 未设置，跳过通知: %s", summarys)
+        return True
+    status, previous_sent = alert_cache.try_reserve(subscription, price, price_step)
+    if status == COOLDOWN:
+        # 冷却中不更新上次价格，冷却结束后按最新价格重新判断
+        logger.info("提醒冷却中，暂不推送: %s", summarys)
+        return False
+    if status == DUPLICATE:
+        logger.info("相同价格区间的提醒已推送过，跳过: %s", summarys)
+        return True
+    response_json = notify_user(contents, summarys)
+    if not response_json or response_json.get("code") != 1000:
+        # 推送失败时撤销记录，也不更新上次价格，下次运行重新推送
+        alert_cache.release(subscription, price, price_step, previous_sent)
+        return False
+    return True
+
+# 请求单条航线的价格数据（在线程池中执行）
+def fetch_route(flight_way, route, direct):
+    # 只有开启追踪时才构造追踪参数
+    span_args = {"route": format_route(route), "type": "direct" if direct else "non_direct"} if tracer.enabled else {}
+    with tracer.span("fetch", **span_args):
+        response = requests.get(route_url(flight_way, route[0], route[1], direct), timeout=20) # 添加超时
+        response.raise_for_status() # 检查 HTTP 错误
+    with tracer.span("parse_json", **span_args):
+        return response.json()
+
 # --- 主逻辑 ---
-if __name__ == "__main__":
+def main():
     # 获取当前脚本所在目录
     current_dir = os.path.dirname(os.path.realpath(__file__))
     config_path = os.path.join(current_dir, 'config.json')
 
     # 读取json配置文件
     try:
-        with open(config_path, 'r', encoding='utf-8') as f:
+        with tracer.span("load_config"), open(config_path, 'r', encoding='utf-8') as f:
             config = json.load(f)
     except FileNotFoundError:
-        logger.error(f"错误：配置文件 {config_path} 未找到。")
+        logger.error("错误：配置文件 %s 未找到。", config_path)
         exit(1)
     except json.JSONDecodeError:
-        logger.error(f"错误：配置文件 {config_path} 格式错误。")
+        logger.error("错误：配置文件 %s 格式错误。", config_path)
         exit(1)
 
     # --- 初始化或读取上次价格 ---
@@ -76,127 +164,189 @@ if __name__ == "__main__":
     config.setdefault("lastDirectPrices", {})
     config.setdefault("lastNonDirectPrices", {})
 
-    # 基础URL
-    baseUrl = "https://flights.ctrip.com/itinerary/api/12808/lowestPrice?"
-
     # 标志位，标记是否有配置被更新
     config_updated = False
 
-    # --- 获取机票信息 ---
-    try:
-        direct_response = requests.get(
-            f'{baseUrl}flightWay={config["flightWay"]}&dcity={config["placeFrom"]}&acity={config["placeTo"]}&direct'
-            f'=true&army=false', timeout=20) # 添加超时
-        direct_response.raise_for_status() # 检查 HTTP 错误
-        direct_data = direct_response.json()
-
-        non_direct_response = requests.get(
-            f'{baseUrl}flightWay={config["flightWay"]}&dcity={config["placeFrom"]}&acity={config["placeTo"]}&army=false',
-             timeout=20) # 添加超时
-        non_direct_response.raise_for_status() # 检查 HTTP 错误
-        non_direct_data = non_direct_response.json()
-
-    except requests.exceptions.Timeout:
-        logger.error("请求携程 API 超时。")
-        exit(1) # 超时则退出，下次 Action 再试
-    except requests.exceptions.RequestException as e:
-        logger.error(f"请求携程 API 时发生错误: {e}")
-        exit(1) # 其他请求错误也退出
-    except json.JSONDecodeError:
-        logger.error("解析携程 API 响应 JSON 时失败。")
-        exit(1) # JSON 解析失败则退出
+    # 出发地和目的地都可以是机场组，展开为所有航线组合
+    origins = parse_airports(config["placeFrom"])
+    destinations = parse_airports(config["placeTo"])
+    routes = route_pairs(origins, destinations)
+    if not routes:
+        logger.error("错误：出发地 %s 与目的地 %s 没有可查询的航线组合。", config["placeFrom"], config["placeTo"])
+        exit(1)
 
-    # 检查 API 返回状态
-    if direct_data.get("status") == 2 or direct_data.get("data") is None:
-        logger.warning(f"无法获取 {config['placeFrom']}->{config['placeTo']} 的直飞机票信息。API 消息: {direct_data.get('msg', '无')}")
-        # 可以选择退出或继续处理非直飞
-        # exit(1) # 如果直飞必须有，则退出
+    # --- 获取机票信息（所有航线的直飞和非直飞数据并行请求）---
+    direct_route_prices = {}
+    non_direct_route_prices = {}
+    failed_requests = 0
+    with ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(routes) * 2)) as executor:
+        futures = {
+            executor.submit(fetch_route, config["flightWay"], route, direct): (route, direct)
+            for route in routes for direct in (True, False)
+        }
+        for future in as_completed(futures):
+            route, direct = futures[future]
+            type_name = "直飞" if direct else "非直飞"
+            try:
+                data = future.result()
+            except requests.exceptions.Timeout:
+                logger.error("请求携程 API 超时（%s %s）。", format_route(route), type_name)
+                failed_requests += 1
+                continue
+            except requests.exceptions.RequestException as e:
+                logger.error("请求携程 API 时发生错误（%s %s）: %s", format_route(route), type_name, e)
+                failed_requests += 1
+                continue
+            except json.JSONDecodeError:
+                logger.error("解析携程 API 响应 JSON 时失败（%s %s）。", format_route(route), type_name)
+                failed_requests += 1
+                continue
 
-    if non_direct_data.get("status") == 2 or non_direct_data.get("data") is None:
-        logger.warning(f"无法获取 {config['placeFrom']}->{config['placeTo']} 的非直飞机票信息。API 消息: {non_direct_data.get('msg', '无')}")
-        # 可以选择退出或继续处理直飞
-        # exit(1) # 如果非直飞必须有，则退出
+            # 检查 API 返回状态，单条航线没有数据时继续处理其他航线
+            prices = extract_prices(data)
+            if not prices:
+                logger.warning("无法获取 %s 的%s机票信息。API 消息: %s", format_route(route), type_name, data.get('msg', '无'))
+            if direct:
+                direct_route_prices[route] = prices
+            else:
+                non_direct_route_prices[route] = prices
 
-    # --- 解析和比较价格 ---
-    # 安全地获取价格数据，避免因 data 为 None 出错
-    direct_results = {}
-    if direct_data.get("data") and direct_data["data"].get("oneWayPrice"):
-        direct_results = direct_data["data"]["oneWayPrice"][0] # 假设总是第一个元素
+    if failed_requests == len(futures):
+        exit(1) # 所有请求都失败则退出，下次 Action 再试
 
-    non_direct_results = {}
-    if non_direct_data.get("data") and non_direct_data["data"].get("oneWayPrice"):
-        non_direct_results = non_direct_data["data"]["oneWayPrice"][0] # 假设总是第一个元素
+    # --- 解析和比较价格 ---
+    # 每个日期取所有航线组合中的最低价，按组合整体的最低价提醒
+    with tracer.span("parse", routes=len(routes)):
+        direct_results = cheapest_by_date(direct_route_prices, config["dateToGo"])
+        non_direct_results = cheapest_by_date(non_direct_route_prices, config["dateToGo"])
 
     current_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S") # 获取当前时间字符串
 
-    for date in config["dateToGo"]:
-        # 使用 .get 获取价格，如果日期不存在则返回 None
-        direct_price = direct_results.get(date)
-        non_direct_price = non_direct_results.get(date)
+    # 跨运行持久化的提醒去重缓存
+    alert_cache = AlertCache(
+        os.path.join(current_dir, ALERT_CACHE_FILE_NAME),
+        ttl=config.get("alertTTL", DEFAULT_ALERT_TTL),
+        cooldown=config.get("alertCooldown", DEFAULT_ALERT_COOLDOWN)
+    )
+    place_from = ",".join(origins)
+    place_to = ",".join(destinations)
 
-        # 获取上次记录的价格，如果日期首次出现，默认为 0 或 None (用 0 便于比较)
-        last_direct_price = config["lastDirectPrices"].get(date, 0)
-        last_non_direct_price = config["lastNonDirectPrices"].get(date, 0)
+    with tracer.span("compare", dates=len(config["dateToGo"])):
+        for date in config["dateToGo"]:
+            # 使用 .get 获取最低价及对应航线，如果日期不存在则返回 None
+            direct_price, direct_route = direct_results.get(date, (None, None))
+            non_direct_price, non_direct_route = non_direct_results.get(date, (None, None))
 
-        logger.info(f"日期: {date}")
+            # 获取上次记录的价格，如果日期首次出现，默认为 0 或 None (用 0 便于比较)
+            last_direct_price = config["lastDirectPrices"].get(date, 0)
+            last_non_direct_price = config["lastNonDirectPrices"].get(date, 0)
 
-        # --- 处理直飞价格 ---
-        if direct_price is None:
-            logger.warning(f"未能获取 {date} 的直飞价格。")
-        else:
-            logger.info(f"  当前直飞价格: {direct_price}, 上次记录价格: {last_direct_price}")
-            if last_direct_price == 0: # 首次记录该日期的价格
-                message_content = (f"【首次推送】\n日期: {date}\n出发地: {config['placeFrom']}\n目的地: {config['placeTo']}\n"
-                                   f"直飞价格: {direct_price}\n查询时间: {current_time_str}")
-                message_summary = f"首次推送-{date}直飞¥{direct_price}"
-                notify_user(message_content, message_summary)
-                config["lastDirectPrices"][date] = direct_price
-                config_updated = True
-            elif abs(direct_price - last_direct_price) >= config["priceStep"]:
-                change = direct_price - last_direct_price
-                change_str = f"+{change}" if change > 0 else str(change)
-                message_content = (f"【价格变动提醒】\n日期: {date}\n出发地: {config['placeFrom']}\n目的地: {config['placeTo']}\n"
-                                   f"类型: 直飞\n当前价格: {direct_price}\n上次价格: {last_direct_price}\n"
-                                   f"价格变化: {change_str}\n查询时间: {current_time_str}")
-                message_summary = f"{date}直飞价格变动 {change_str} (¥{direct_price})"
-                notify_user(message_content, message_summary)
-                config["lastDirectPrices"][date] = direct_price
-                config_updated = True
-            # else: # 价格未变动或变动未达阈值，无需通知，也无需更新 last price
-
-        # --- 处理非直飞价格 ---
-        if non_direct_price is None:
-            logger.warning(f"未能获取 {date} 的非直飞价格。")
-        else:
-            logger.info(f"  当前非直飞价格: {non_direct_price}, 上次记录价格: {last_non_direct_price}")
-            if last_non_direct_price == 0: # 首次记录该日期的价格
-                message_content = (f"【首次推送】\n日期: {date}\n出发地: {config['placeFrom']}\n目的地: {config['placeTo']}\n"
-                                   f"非直飞价格: {non_direct_price}\n查询时间: {current_time_str}")
-                message_summary = f"首次推送-{date}非直飞¥{non_direct_price}"
-                notify_user(message_content, message_summary)
-                config["lastNonDirectPrices"][date] = non_direct_price
-                config_updated = True
-            elif abs(non_direct_price - last_non_direct_price) >= config["priceStep"]:
-                change = non_direct_price - last_non_direct_price
-                change_str = f"+{change}" if change > 0 else str(change)
-                message_content = (f"【价格变动提醒】\n日期: {date}\n出发地: {config['placeFrom']}\n目的地: {config['placeTo']}\n"
-                                   f"类型: 非直飞\n当前价格: {non_direct_price}\n上次价格: {last_non_direct_price}\n"
-                                   f"价格变化: {change_str}\n查询时间: {current_time_str}")
-                message_summary = f"{date}非直飞价格变动 {change_str} (¥{non_direct_price})"
-                notify_user(message_content, message_summary)
-                config["lastNonDirectPrices"][date] = non_direct_price
-                config_updated = True
-            # else: # 价格未变动或变动未达阈值，无需通知，也无需更新 last price
+            logger.debug("日期: %s", date)
+            direct_subscription = subscription_key(place_from, place_to, date, "direct")
+            non_direct_subscription = subscription_key(place_from, place_to, date, "non_direct")
+
+            # --- 处理直飞价格 ---
+            if direct_price is None:
+                logger.warning("未能获取 %s 的直飞价格。", date)
+            else:
+                logger.debug("  当前直飞价格: %s (%s→%s), 上次记录价格: %s", direct_price, *direct_route, last_direct_price)
+                if last_direct_price == 0: # 首次记录该日期的价格
+                    message_content = (f"【首次推送】\n日期: {date}\n出发地: {direct_route[0]}\n目的地: {direct_route[1]}\n"
+                                       f"直飞价格: {direct_price}\n查询时间: {current_time_str}")
+                    message_summary = f"首次推送-{date}直飞¥{direct_price}"
+                    if dispatch_alert(alert_cache, direct_subscription, direct_price, config["priceStep"], message_content, message_summary):
+                        config["lastDirectPrices"][date] = direct_price
+                        config_updated = True
+                elif abs(direct_price - last_direct_price) >= config["priceStep"]:
+                    change = direct_price - last_direct_price
+                    change_str = f"+{change}" if change > 0 else str(change)
+                    message_content = (f"【价格变动提醒】\n日期: {date}\n出发地: {direct_route[0]}\n目的地: {direct_route[1]}\n"
+                                       f"类型: 直飞\n当前价格: {direct_price}\n上次价格: {last_direct_price}\n"
+                                       f"价格变化: {change_str}\n查询时间: {current_time_str}")
+                    message_summary = f"{date}直飞价格变动 {change_str} (¥{direct_price})"
+                    if dispatch_alert(alert_cache, direct_subscription, direct_price, config["priceStep"], message_content, message_summary):
+                        config["lastDirectPrices"][date] = direct_price
+                        config_updated = True
+                # else: # 价格未变动或变动未达阈值，无需通知，也无需更新 last price
+
+            # --- 处理非直飞价格 ---
+            if non_direct_price is None:
+                logger.warning("未能获取 %s 的非直飞价格。", date)
+            else:
+                logger.debug("  当前非直飞价格: %s (%s→%s), 上次记录价格: %s", non_direct_price, *non_direct_route, last_non_direct_price)
+                if last_non_direct_price == 0: # 首次记录该日期的价格
+                    message_content = (f"【首次推送】\n日期: {date}\n出发地: {non_direct_route[0]}\n目的地: {non_direct_route[1]}\n"
+                                       f"非直飞价格: {non_direct_price}\n查询时间: {current_time_str}")
+                    message_summary = f"首次推送-{date}非直飞¥{non_direct_price}"
+                    if dispatch_alert(alert_cache, non_direct_subscription, non_direct_price, config["priceStep"], message_content, message_summary):
+                        config["lastNonDirectPrices"][date] = non_direct_price
+                        config_updated = True
+                elif abs(non_direct_price - last_non_direct_price) >= config["priceStep"]:
+                    change = non_direct_price - last_non_direct_price
+                    change_str = f"+{change}" if change > 0 else str(change)
+                    message_content = (f"【价格变动提醒】\n日期: {date}\n出发地: {non_direct_route[0]}\n目的地: {non_direct_route[1]}\n"
+                                       f"类型: 非直飞\n当前价格: {non_direct_price}\n上次价格: {last_non_direct_price}\n"
+                                       f"价格变化: {change_str}\n查询时间: {current_time_str}")
+                    message_summary = f"{date}非直飞价格变动 {change_str} (¥{non_direct_price})"
+                    if dispatch_alert(alert_cache, non_direct_subscription, non_direct_price, config["priceStep"], message_content, message_summary):
+                        config["lastNonDirectPrices"][date] = non_direct_price
+                        config_updated = True
+                # else: # 价格未变动或变动未达阈值，无需通知，也无需更新 last price
+
+    alert_cache.save()
 
     # --- 保存更新后的配置 ---
     if config_updated:
         try:
-            with open(config_path, 'w', encoding='utf-8') as f:
+            with tracer.span("save_config"), open(config_path, 'w', encoding='utf-8') as f:
                 json.dump(config, f, indent=4, ensure_ascii=False) # ensure_ascii=False 保证中文正常写入
-            logger.info(f"配置文件 {config_path} 已更新。")
+            logger.info("配置文件 %s 已更新。", config_path)
         except IOError as e:
-            logger.error(f"无法写入配置文件 {config_path}: {e}")
+            logger.error("无法写入配置文件 %s: %s", config_path, e)
     else:
         logger.info("价格无变化或变化未达阈值，配置文件未更新。")
 
     logger.info("机票价格检查完成。")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="机票价格检查（单次运行）")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"记录各阶段耗时并输出 Chrome trace 文件（也可设置环境变量 {PROFILE_ENV}=1）")
+    parser.add_argument("--cprofile", action="store_true",
+                        help=f"额外输出 cProfile 统计文件（也可设置环境变量 {PROFILE_ENV}=cprofile）")
+    parser.add_argument("--verbose", action="store_true",
+                        help="输出每个日期的详细价格日志（DEBUG 级别）")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+    setup_logging(os.path.join(script_dir, LOG_DIR_NAME), level=logging.DEBUG if args.verbose else None)
+
+    profile_env = os.getenv(PROFILE_ENV, "").strip().lower()
+    use_cprofile = args.cprofile or profile_env == "cprofile"
+    tracer.enabled = args.profile or use_cprofile or profile_env not in ("", "0", "false")
+
+    profiler = cProfile.Profile() if use_cprofile else None
+    if profiler:
+        profiler.enable()
+    try:
+        with tracer.span("sweep"):
+            main()
+    finally:
+        # 即使中途 exit 也写出已记录的追踪数据
+        if profiler:
+            profiler.disable()
+        if tracer.enabled:
+            profile_dir = os.path.join(script_dir, PROFILE_DIR_NAME)
+            os.makedirs(profile_dir, exist_ok=True)
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            trace_path = os.path.join(profile_dir, f"sweep-{stamp}.trace.json")
+            tracer.dump(trace_path)
+            logger.info("阶段追踪已写入: %s", trace_path)
+            if profiler:
+                pstats_path = os.path.join(profile_dir, f"sweep-{stamp}.pstats")
+                profiler.dump_stats(pstats_path)
+                logger.info("cProfile 统计已写入: %s", pstats_path)
@@ -0,0 +1,130 @@
+"""提醒去重缓存：跨重启记录已推送的提醒，避免重复推送
+
+每条提醒按“订阅（航线组/日期/类型）+ 价格区间”生成指纹：
+- 同一指纹在 TTL 内只推送一次，价格在两个区间之间来回波动时不会反复推送
+- 同一订阅两次推送之间至少间隔冷却时间
+缓存保存在 JSON 文件中，过期条目在保存时清理（判断时同样会忽略过期条目）。
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger('alert_cache')
+
+ALERT_CACHE_FILE_NAME = "alert_cache.json"
+DEFAULT_ALERT_TTL = 24 * 3600  # 相同提醒的去重时间（秒）
+DEFAULT_ALERT_COOLDOWN = 30 * 60  # 同一订阅两次推送的最小间隔（秒）
+
+# check() 的返回值
+ALLOW = "allow"
+DUPLICATE = "duplicate"
+COOLDOWN = "cooldown"
+
+
+def subscription_key(place_from, place_to, date, alert_type):
+    """订阅标识：航线组 + 日期 + 提醒类型（direct / non_direct）"""
+    return f"{place_from}->{place_to}|{date}|{alert_type}"
+
+
+class AlertCache:
+    def __init__(self, path, ttl=DEFAULT_ALERT_TTL, cooldown=DEFAULT_ALERT_COOLDOWN):
+        self.path = path
+        self.ttl = ttl
+        self.cooldown = cooldown
+        self.alerts = {}  # 指纹 -> 推送时间
+        self.last_sent = {}  # 订阅 -> 最近一次推送时间
+        self._dirty = False
+        # 所有修改和写文件都在锁内进行，避免多个监控线程互相覆盖记录
+        self._lock = threading.RLock()
+        self._load()
+
+    @staticmethod
+    def fingerprint(subscription, price, bucket_size):
+        """按价格区间生成指纹，区间大小通常取价格变动阈值"""
+        bucket_size = max(int(bucket_size), 1)
+        return f"{subscription}|{bucket_size}|{int(price) // bucket_size}"
+
+    def check(self, subscription, price, bucket_size, now=None):
+        """判断提醒是否可以推送，返回 ALLOW / DUPLICATE / COOLDOWN"""
+        now = time.time() if now is None else now
+        sent_at = self.alerts.get(self.fingerprint(subscription, price, bucket_size))
+        if sent_at is not None and now - sent_at < self.ttl:
+            return DUPLICATE
+        last_sent = self.last_sent.get(subscription)
+        if last_sent is not None and now - last_sent < self.cooldown:
+            return COOLDOWN
+        return ALLOW
+
+    def record(self, subscription, price, bucket_size, now=None):
+        """记录一次已推送的提醒"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self.alerts[self.fingerprint(subscription, price, bucket_size)] = now
+            self.last_sent[subscription] = now
+            self._dirty = True
+
+    def try_reserve(self, subscription, price, bucket_size, now=None):
+        """在锁内检查并立即记录一次提醒，避免多个线程重复推送
+
+        返回 (状态, 占用前的最近推送时间)。状态为 ALLOW 时提醒已被记录，
+        推送失败时应把第二个返回值传给 release() 撤销记录。
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            status = self.check(subscription, price, bucket_size, now)
+            previous_sent = self.last_sent.get(subscription)
+            if status == ALLOW:
+                self.record(subscription, price, bucket_size, now)
+            return status, previous_sent
+
+    def release(self, subscription, price, bucket_size, previous_sent):
+        """撤销 try_reserve() 记录的提醒"""
+        with self._lock:
+            self.alerts.pop(self.fingerprint(subscription, price, bucket_size), None)
+            if previous_sent is None:
+                self.last_sent.pop(subscription, None)
+            else:
+                self.last_sent[subscription] = previous_sent
+            self._dirty = True
+
+    def evict_expired(self, now=None):
+        """清理已过期的指纹和冷却记录"""
+        now = time.time() if now is None else now
+        with self._lock:
+            alerts = {key: sent_at for key, sent_at in self.alerts.items() if now - sent_at < self.ttl}
+            last_sent = {key: sent_at for key, sent_at in self.last_sent.items() if now - sent_at < self.cooldown}
+            if len(alerts) != len(self.alerts) or len(last_sent) != len(self.last_sent):
+                self.alerts = alerts
+                self.last_sent = last_sent
+                self._dirty = True
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.alerts = dict(data.get("alerts", {}))
+            self.last_sent = dict(data.get("lastSent", {}))
+        except (IOError, ValueError, AttributeError) as e:
+            # 缓存损坏时从空缓存开始，最多多推送一次
+            logger.warning("无法读取提醒缓存 %s，将重新记录: %s", self.path, e)
+            self.alerts = {}
+            self.last_sent = {}
+
+    def save(self):
+        """有变化时写回缓存文件"""
+        with self._lock:
+            self.evict_expired()
+            if not self._dirty:
+                return
+            try:
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({"alerts": self.alerts, "lastSent": self.last_sent}, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+            except IOError as e:
+                logger.error("无法写入提醒缓存 %s: %s", self.path, e)
@@ -1,13 +1,140 @@
 import json
+import logging
 import os
-import time
+import queue
 import threading
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 import requests
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from datetime import datetime
 import sys
 from PIL import Image, ImageTk
+from flight_alert_cache import (AlertCache, subscription_key, ALERT_CACHE_FILE_NAME, DEFAULT_ALERT_TTL,
+                                DEFAULT_ALERT_COOLDOWN, COOLDOWN, DUPLICATE)
+from flight_logging import setup_logging
+from flight_routes import parse_airports, route_pairs, route_url, format_route, extract_prices, cheapest_by_date
+
+# 所有网络请求的超时时间（连接超时, 读取超时），单位秒
+REQUEST_TIMEOUT = (5, 20)
+# 请求失败后的重试等待时间（秒）
+RETRY_DELAY = 30
+# 等待请求结果时检查停止信号的间隔（秒）
+CANCEL_POLL_INTERVAL = 0.05
+# 并行请求航线数据的最大线程数
+MAX_FETCH_WORKERS = 8
+# 日志框批量刷新间隔（毫秒）
+LOG_POLL_INTERVAL_MS = 200
+
+logger = logging.getLogger('gui')
+
+
+class LogWidgetHandler(logging.Handler):
+    """在日志后台线程中格式化记录并缓存，由 Tk 主线程定时批量写入日志框"""
+
+    def __init__(self, level=logging.INFO):
+        super().__init__(level)
+        self.pending = deque()
+        self.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", "%Y-%m-%d %H:%M:%S"))
+
+    def emit(self, record):
+        try:
+            self.pending.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+class MonitorCancelled(Exception):
+    """监控在等待请求结果时被停止"""
+
+
+class DaemonThreadExecutor:
+    """由固定数量守护线程执行任务的简单执行器
+
+    与 ThreadPoolExecutor 不同，工作线程都是守护线程，关闭窗口时
+    进行中的请求不会阻止程序退出；排队中被取消的任务出队时直接丢弃。
+    """
+
+    def __init__(self, max_workers):
+        self._max_workers = max_workers
+        self._queue = queue.Queue()
+        self._workers = []
+        self._shutdown = False
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("执行器已关闭")
+            self._queue.put((future, fn, args))
+            # 按需启动工作线程，总数不超过 max_workers
+            if len(self._workers) < self._max_workers:
+                worker = threading.Thread(target=self._work, daemon=True)
+                worker.start()
+                self._workers.append(worker)
+        return future
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, fn, args = item
+            # 排队期间已被取消的任务直接丢弃
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def cancel_pending(self):
+        """取消所有排队中的任务；进行中的请求会在超时后自行结束"""
+        stop_signals = 0
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                stop_signals += 1
+            else:
+                item[0].cancel()
+        # 保留工作线程的退出信号
+        for _ in range(stop_signals):
+            self._queue.put(None)
+
+    def shutdown(self):
+        """取消排队中的任务，工作线程完成当前任务后退出"""
+        self.cancel_pending()
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            for _ in self._workers:
+                self._queue.put(None)
+
+
+def _fetch_json(url):
+    """请求携程接口并解析JSON，失败时返回None"""
+    response = requests.get(url, timeout=REQUEST_TIMEOUT)
+    if response.status_code != 200:
+        return None
+    return response.json()
+
+
+def _wait_result(future, stop_event):
+    """等待请求结果，收到停止信号时立即放弃并抛出 MonitorCancelled"""
+    while not stop_event.is_set():
+        try:
+            return future.result(timeout=CANCEL_POLL_INTERVAL)
+        except FutureTimeoutError:
+            continue
+    future.cancel()
+    raise MonitorCancelled()
+
 
 class FlightAlertApp:
     def __init__(self, root):
@@ -26,6 +153,10 @@ class FlightAlertApp:
         self.config_dir = self._get_config_dir()
         os.makedirs(self.config_dir, exist_ok=True)
         
+        # 配置日志：文件写入配置目录下的 logs，界面日志框只显示 INFO 及以上
+        self.log_handler = LogWidgetHandler()
+        setup_logging(os.path.join(self.config_dir, 'logs'), console=False, extra_handlers=[self.log_handler])
+        
         # 配置样式
         self._setup_styles()
         
@@ -41,14 +172,23 @@ class FlightAlertApp:
         # 监控状态
         self.running = False
         self.monitor_thread = None
-        self.target_prices = {}
-        self.no_target_prices = {}
+        self.stop_event = None
+        self.fetch_executor = None
+        
+        # 提醒去重缓存，重启后仍然有效，避免重复推送首次提醒
+        self.alert_cache = AlertCache(os.path.join(self.config_dir, ALERT_CACHE_FILE_NAME))
         
         # 创建UI
         self._create_ui()
         
         # 加载配置（如果存在）
         self._load_config()
+        
+        # 开始定时刷新日志框
+        self.root.after(LOG_POLL_INTERVAL_MS, self._drain_log)
+        
+        # 关闭窗口时先停止监控
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
     
     def _get_config_dir(self):
         """获取配置文件目录"""
@@ -162,12 +302,12 @@ class FlightAlertApp:
         date_entry.grid(row=0, column=1, sticky=tk.W, pady=(10, 5))
         
         # 出发地
-        ttk.Label(form_frame, text="出发机场代码:", style="Subtitle.TLabel").grid(row=1, column=0, sticky=tk.W, pady=10)
-        ttk.Entry(form_frame, textvariable=self.place_from_var, width=10).grid(row=1, column=1, sticky=tk.W, pady=10)
+        ttk.Label(form_frame, text="出发机场代码 (多个用逗号分隔):", style="Subtitle.TLabel").grid(row=1, column=0, sticky=tk.W, pady=10)
+        ttk.Entry(form_frame, textvariable=self.place_from_var, width=30).grid(row=1, column=1, sticky=tk.W, pady=10)
         
         # 目的地
-        ttk.Label(form_frame, text="到达机场代码:", style="Subtitle.TLabel").grid(row=2, column=0, sticky=tk.W, pady=10)
-        ttk.Entry(form_frame, textvariable=self.place_to_var, width=10).grid(row=2, column=1, sticky=tk.W, pady=10)
+        ttk.Label(form_frame, text="到达机场代码 (多个用逗号分隔):", style="Subtitle.TLabel").grid(row=2, column=0, sticky=tk.W, pady=10)
+        ttk.Entry(form_frame, textvariable=self.place_to_var, width=30).grid(row=2, column=1, sticky=tk.W, pady=10)
         
         # 航程类型
         ttk.Label(form_frame, text="航程类型:", style="Subtitle.TLabel").grid(row=3, column=0, sticky=tk.W, pady=10)
@@ -260,7 +400,9 @@ class FlightAlertApp:
                 "flightWay": self.flight_way_var.get(),
                 "sleepTime": int(self.sleep_time_var.get()),
                 "priceStep": int(self.price_step_var.get()),
-                "SCKEY": self.sckey_var.get()
+                "SCKEY": self.sckey_var.get(),
+                "alertTTL": self.alert_cache.ttl,
+                "alertCooldown": self.alert_cache.cooldown
             }
             
             # 验证配置
@@ -278,10 +420,10 @@ class FlightAlertApp:
             with open(config_path, 'w', encoding='utf-8') as f:
                 json.dump(config, f, indent=4, ensure_ascii=False)
             
-            self._log(f"配置保存成功: {config_path}")
+            self._log("配置保存成功: %s", config_path)
             messagebox.showinfo("成功", "配置保存成功")
         except Exception as e:
-            self._log(f"保存配置出错: {str(e)}")
+            self._log("保存配置出错: %s", e, level=logging.ERROR)
             messagebox.showerror("错误", f"保存配置失败: {str(e)}")
     
     def _load_config(self):
@@ -302,10 +444,12 @@ class FlightAlertApp:
             self.sleep_time_var.set(str(config.get("sleepTime", 600)))
             self.price_step_var.set(str(config.get("priceStep", 50)))
             self.sckey_var.set(config.get("SCKEY", ""))
+            self.alert_cache.ttl = config.get("alertTTL", DEFAULT_ALERT_TTL)
+            self.alert_cache.cooldown = config.get("alertCooldown", DEFAULT_ALERT_COOLDOWN)
             
-            self._log(f"配置加载成功: {config_path}")
+            self._log("配置加载成功: %s", config_path)
         except Exception as e:
-            self._log(f"加载配置出错: {str(e)}")
+            self._log("加载配置出错: %s", e, level=logging.ERROR)
             messagebox.showerror("错误", f"加载配置失败: {str(e)}")
     
     def _start_monitoring(self):
@@ -328,6 +472,8 @@ class FlightAlertApp:
                 raise ValueError("请输入出发机场代码")
             if not place_to:
                 raise ValueError("请输入到达机场代码")
+            if not route_pairs(parse_airports(place_from), parse_airports(place_to)):
+                raise ValueError("出发机场与到达机场没有可查询的航线组合")
             
             # 创建配置
             self.config = {
@@ -340,9 +486,16 @@ class FlightAlertApp:
                 "SCKEY": sckey
             }
             
-            # 初始化目标价格
-            self.target_prices = {date: 0 for date in self.config["dateToGo"]}
-            self.no_target_prices = {date: 0 for date in self.config["dateToGo"]}
+            # 初始化目标价格（每轮监控独立，旧线程不会写入新一轮的价格记录）
+            target_prices = {date: 0 for date in self.config["dateToGo"]}
+            no_target_prices = {date: 0 for date in self.config["dateToGo"]}
+            
+            # 旧线程可能还在退出途中，确保它收到停止信号
+            self._cancel_current_run()
+            
+            # 每次启动使用独立的停止事件和请求执行器，旧线程不会被新一轮监控“复活”
+            self.stop_event = threading.Event()
+            self.fetch_executor = DaemonThreadExecutor(MAX_FETCH_WORKERS)
             
             # 更新UI
             self.running = True
@@ -350,14 +503,17 @@ class FlightAlertApp:
             self.stop_button.config(state=tk.NORMAL)
             self.status_label.config(text="价格监控进行中...")
             
-            # 开始监控线程
-            self.monitor_thread = threading.Thread(target=self._monitor_prices)
-            self.monitor_thread.daemon = True
+            # 开始监控线程（传入配置快照，运行中修改设置不会影响当前线程）
+            self.monitor_thread = threading.Thread(
+                target=self._monitor_prices,
+                args=(dict(self.config), self.stop_event, self.fetch_executor, target_prices, no_target_prices),
+                daemon=True
+            )
             self.monitor_thread.start()
             
             self._log("价格监控已启动")
         except Exception as e:
-            self._log(f"启动监控出错: {str(e)}")
+            self._log("启动监控出错: %s", e, level=logging.ERROR)
             messagebox.showerror("错误", f"启动监控失败: {str(e)}")
     
     def _stop_monitoring(self):
@@ -365,154 +521,224 @@ class FlightAlertApp:
             return
         
         self.running = False
+        self._cancel_current_run()
         self.start_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
         self.status_label.config(text="监控已停止")
         self._log("价格监控已停止")
     
-    def _monitor_prices(self):
-        baseUrl = "https://flights.ctrip.com/itinerary/api/12808/lowestPrice?"
+    def _cancel_current_run(self):
+        """通知当前监控线程停止，并取消它尚未开始的请求"""
+        if self.stop_event is not None:
+            self.stop_event.set()
+        if self.fetch_executor is not None:
+            self.fetch_executor.cancel_pending()
+    
+    def _on_close(self):
+        """关闭窗口时停止监控，进行中的请求在守护线程中，不会阻止程序退出"""
+        self.running = False
+        self._cancel_current_run()
+        self.root.destroy()
+    
+    def _monitor_prices(self, config, stop_event, executor, target_prices, no_target_prices):
+        # 出发地和目的地都可以是机场组，展开为所有航线组合
+        origins = parse_airports(config["placeFrom"])
+        destinations = parse_airports(config["placeTo"])
+        routes = route_pairs(origins, destinations)
+        # 订阅标识使用规范化后的机场代码，输入中的空格和大小写不影响去重
+        place_from = ",".join(origins)
+        place_to = ",".join(destinations)
         
-        while self.running:
-            try:
-                # 更新状态
-                self._update_status(f"正在检查价格 ({datetime.now().strftime('%H:%M:%S')})")
-                
-                # 获取直飞和非直飞航班价格
-                direct_url = f'{baseUrl}flightWay={self.config["flightWay"]}&dcity={self.config["placeFrom"]}&acity={self.config["placeTo"]}&direct=true&army=false'
-                non_direct_url = f'{baseUrl}flightWay={self.config["flightWay"]}&dcity={self.config["placeFrom"]}&acity={self.config["placeTo"]}&army=false'
-                
-                self._log(f"正在请求直飞航班数据...")
-                direct_response = requests.get(direct_url)
-                
-                if direct_response.status_code != 200 or direct_response.json()["status"] == 2:
-                    self._log("获取直飞航班数据失败，将在30秒后重试")
-                    self._update_prices_display("获取直飞航班数据失败")
+        try:
+            while not stop_event.is_set():
+                try:
+                    # 更新状态
+                    self._update_status(f"正在检查价格 ({datetime.now().strftime('%H:%M:%S')})")
                     
-                    # 等待重试
-                    for i in range(30):
-                        if not self.running:
-                            return
-                        time.sleep(1)
+                    # 所有航线的直飞和非直飞请求并行发出，等待期间随时响应停止信号
+                    logger.debug("正在请求 %s 条航线的直飞和非直飞航班数据...", len(routes))
+                    futures = {
+                        (route, direct): executor.submit(_fetch_json, route_url(config["flightWay"], route[0], route[1], direct))
+                        for route in routes for direct in (True, False)
+                    }
                     
-                    continue
-                
-                self._log(f"正在请求非直飞航班数据...")
-                non_direct_response = requests.get(non_direct_url)
-                
-                if non_direct_response.status_code != 200 or non_direct_response.json()["status"] == 2:
-                    self._log("获取非直飞航班数据失败，将在30秒后重试")
-                    self._update_prices_display("获取非直飞航班数据失败")
+                    direct_route_prices = {}
+                    non_direct_route_prices = {}
+                    for (route, direct), future in futures.items():
+                        try:
+                            prices = extract_prices(_wait_result(future, stop_event))
+                        except (requests.exceptions.RequestException, ValueError) as e:
+                            # 单条航线失败不影响其他航线
+                            logger.warning("请求 %s 航班数据失败: %s", format_route(route), e)
+                            prices = {}
+                        if direct:
+                            direct_route_prices[route] = prices
+                        else:
+                            non_direct_route_prices[route] = prices
                     
-                    # 等待重试
-                    for i in range(30):
-                        if not self.running:
+                    if not any(direct_route_prices.values()):
+                        self._log("获取直飞航班数据失败，将在%s秒后重试", RETRY_DELAY, level=logging.WARNING)
+                        self._update_prices_display("获取直飞航班数据失败")
+                        
+                        # 等待重试
+                        if stop_event.wait(RETRY_DELAY):
                             return
-                        time.sleep(1)
+                        continue
                     
-                    continue
-                
-                # 解析响应
-                direct_results = direct_response.json()["data"]["oneWayPrice"][0]
-                non_direct_results = non_direct_response.json()["data"]["oneWayPrice"][0]
-                
-                # 更新价格显示
-                prices_text = ""
-                
-                for date in self.config["dateToGo"]:
-                    if date not in direct_results or date not in non_direct_results:
-                        self._log(f"未找到日期 {date} 的数据")
-                        prices_text += f"日期 {date}: 暂无数据\n"
+                    if not any(non_direct_route_prices.values()):
+                        self._log("获取非直飞航班数据失败，将在%s秒后重试", RETRY_DELAY, level=logging.WARNING)
+                        self._update_prices_display("获取非直飞航班数据失败")
+                        
+                        # 等待重试
+                        if stop_event.wait(RETRY_DELAY):
+                            return
                         continue
                     
-                    direct_price = direct_results[date]
-                    non_direct_price = non_direct_results[date]
+                    # 每个日期取所有航线组合中的最低价
+                    direct_results = cheapest_by_date(direct_route_prices, config["dateToGo"])
+                    non_direct_results = cheapest_by_date(non_direct_route_prices, config["dateToGo"])
                     
-                    formatted_date = f"{date[:4]}-{date[4:6]}-{date[6:]}"
-                    prices_text += f"日期 {formatted_date}: 直飞 ¥{direct_price}, 非直飞 ¥{non_direct_price}\n"
-                    self._log(f"日期 {formatted_date}: 直飞 ¥{direct_price}, 非直飞 ¥{non_direct_price}")
+                    # 更新价格显示
+                    prices_text = ""
                     
-                    if self.target_prices[date] == 0:
-                        # 首次获取价格
-                        self._log(f"首次获取 {formatted_date} 的价格，正在发送通知")
-                        self._push_message(
-                            f'首次提醒: {formatted_date} 的直飞价格 ¥{direct_price}, 非直飞价格 ¥{non_direct_price}',
-                            self.config["SCKEY"]
-                        )
-                        self.target_prices[date] = direct_price
-                        self.no_target_prices[date] = non_direct_price
-                    else:
-                        # 检查价格变化
-                        if abs(direct_price - self.target_prices[date]) >= self.config["priceStep"]:
-                            change = direct_price - self.target_prices[date]
+                    for date in config["dateToGo"]:
+                        # 停止后不再发送任何通知
+                        if stop_event.is_set():
+                            return
+                        
+                        if date not in direct_results or date not in non_direct_results:
+                            self._log("未找到日期 %s 的数据", date, level=logging.WARNING)
+                            prices_text += f"日期 {date}: 暂无数据\n"
+                            continue
+                        
+                        direct_price, direct_route = direct_results[date]
+                        non_direct_price, non_direct_route = non_direct_results[date]
+                        direct_text = f"¥{direct_price} ({format_route(direct_route)})"
+                        non_direct_text = f"¥{non_direct_price} ({format_route(non_direct_route)})"
+                        
+                        formatted_date = f"{date[:4]}-{date[4:6]}-{date[6:]}"
+                        prices_text += f"日期 {formatted_date}: 直飞 {direct_text}, 非直飞 {non_direct_text}\n"
+                        logger.debug("日期 %s: 直飞 %s, 非直飞 %s", formatted_date, direct_text, non_direct_text)
+                        
+                        direct_subscription = subscription_key(place_from, place_to, date, "direct")
+                        non_direct_subscription = subscription_key(place_from, place_to, date, "non_direct")
+                        
+                        # 直飞和非直飞分别经过去重缓存检查：首次获取价格时发送首次提醒，
+                        # 之后价格变动达到阈值时提醒
+                        if target_prices[date] == 0:
+                            direct_message = f'首次提醒: {formatted_date} 的直飞价格 {direct_text}'
+                        elif abs(direct_price - target_prices[date]) >= config["priceStep"]:
+                            change = direct_price - target_prices[date]
                             change_text = "上涨" if change > 0 else "下降"
-                            self._log(f"{formatted_date} 的直飞价格{change_text} ¥{abs(change)} (从 ¥{self.target_prices[date]} 变为 ¥{direct_price})")
-                            self._push_message(
-                                f'{formatted_date} 的直飞价格{change_text} ¥{abs(change)}，当前价格: ¥{direct_price}',
-                                self.config["SCKEY"]
-                            )
-                            self.target_prices[date] = direct_price
+                            self._log("%s 的直飞价格%s ¥%s (从 ¥%s 变为 ¥%s)", formatted_date, change_text, abs(change), target_prices[date], direct_price)
+                            direct_message = f'{formatted_date} 的直飞价格{change_text} ¥{abs(change)}，当前价格: {direct_text}'
+                        else:
+                            direct_message = None
+                        
+                        if direct_message and self._dispatch_alert(
+                            stop_event, direct_subscription, direct_price, config["priceStep"], direct_message, config["SCKEY"]
+                        ):
+                            target_prices[date] = direct_price
                         
-                        if abs(non_direct_price - self.no_target_prices[date]) >= self.config["priceStep"]:
-                            change = non_direct_price - self.no_target_prices[date]
+                        if no_target_prices[date] == 0:
+                            non_direct_message = f'首次提醒: {formatted_date} 的非直飞价格 {non_direct_text}'
+                        elif abs(non_direct_price - no_target_prices[date]) >= config["priceStep"]:
+                            change = non_direct_price - no_target_prices[date]
                             change_text = "上涨" if change > 0 else "下降"
-                            self._log(f"{formatted_date} 的非直飞价格{change_text} ¥{abs(change)} (从 ¥{self.no_target_prices[date]} 变为 ¥{non_direct_price})")
-                            self._push_message(
-                                f'{formatted_date} 的非直飞价格{change_text} ¥{abs(change)}，当前价格: ¥{non_direct_price}',
-                                self.config["SCKEY"]
-                            )
-                            self.no_target_prices[date] = non_direct_price
-                
-                # 更新价格显示
-                self._update_prices_display(prices_text)
-                
-                # 等待下次检查
-                self._update_status(f"下次检查将在 {self.config['sleepTime']} 秒后进行")
-                
-                for i in range(self.config["sleepTime"]):
-                    if not self.running:
+                            self._log("%s 的非直飞价格%s ¥%s (从 ¥%s 变为 ¥%s)", formatted_date, change_text, abs(change), no_target_prices[date], non_direct_price)
+                            non_direct_message = f'{formatted_date} 的非直飞价格{change_text} ¥{abs(change)}，当前价格: {non_direct_text}'
+                        else:
+                            non_direct_message = None
+                        
+                        if non_direct_message and self._dispatch_alert(
+                            stop_event, non_direct_subscription, non_direct_price, config["priceStep"], non_direct_message, config["SCKEY"]
+                        ):
+                            no_target_prices[date] = non_direct_price
+                    
+                    self.alert_cache.save()
+                    
+                    # 更新价格显示
+                    self._update_prices_display(prices_text)
+                    
+                    # 等待下次检查
+                    self._update_status(f"下次检查将在 {config['sleepTime']} 秒后进行")
+                    
+                    if stop_event.wait(config["sleepTime"]):
                         return
-                    time.sleep(1)
-                
-            except Exception as e:
-                self._log(f"监控过程中出错: {str(e)}")
-                self._update_status(f"错误: {str(e)}")
-                
-                # 等待重试
-                for i in range(30):
-                    if not self.running:
+                    
+                except MonitorCancelled:
+                    return
+                except Exception as e:
+                    self._log("监控过程中出错: %s", e, level=logging.ERROR)
+                    self._update_status(f"错误: {str(e)}")
+                    
+                    # 等待重试
+                    if stop_event.wait(RETRY_DELAY):
                         return
-                    time.sleep(1)
+        finally:
+            # 取消尚未开始的请求并回收工作线程；不等待仍在进行的请求，它们会在超时后自行结束
+            executor.shutdown()
+            # 中途停止或出错时也保存本轮已推送的提醒记录
+            self.alert_cache.save()
+    
+    def _dispatch_alert(self, stop_event, subscription, price, price_step, message, token):
+        """经过去重缓存检查后发送通知，返回是否应更新上次记录价格"""
+        # 停止后不再发送任何通知，上一条推送可能阻塞到超时才返回
+        if stop_event.is_set():
+            return False
+        if not token:
+            # 未配置推送时照常跟踪价格，只是不发送通知
+            self._log("未提供PushPlus令牌，跳过通知")
+            return True
+        # 检查和占用在同一把锁内完成，新旧监控线程不会重复推送同一提醒
+        status, previous_sent = self.alert_cache.try_reserve(subscription, price, price_step)
+        if status == COOLDOWN:
+            # 冷却中不更新上次价格，冷却结束后按最新价格重新判断
+            self._log("提醒冷却中，暂不推送: %s", message)
+            return False
+        if status == DUPLICATE:
+            self._log("相同价格区间的提醒已推送过，跳过: %s", message)
+            return True
+        if not self._push_message(message, token):
+            # 推送失败时撤销占用，也不更新上次价格，下次检查重新推送
+            self.alert_cache.release(subscription, price, price_step, previous_sent)
+            return False
+        return True
     
     def _push_message(self, message, token):
+        """发送 PushPlus 通知，返回是否发送成功"""
         if not token:
             self._log("未提供PushPlus令牌，跳过通知")
-            return
+            return False
         
         try:
             send_url = f'https://www.pushplus.plus/send?token={token}&title=航班价格提醒&content={message}'
-            response = requests.get(send_url)
+            response = requests.get(send_url, timeout=REQUEST_TIMEOUT)
             
             if response.status_code == 200:
-                self._log(f"通知已发送: {message}")
-            else:
-                self._log(f"发送通知失败: {response.status_code}")
+                self._log("通知已发送: %s", message)
+                return True
+            self._log("发送通知失败: %s", response.status_code, level=logging.ERROR)
         except Exception as e:
-            self._log(f"发送通知出错: {str(e)}")
+            self._log("发送通知出错: %s", e, level=logging.ERROR)
+        return False
     
-    def _log(self, message):
-        """添加带时间戳的日志消息"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_message = f"[{timestamp}] {message}\n"
-        
-        self.root.after(0, self._update_log, log_message)
+    def _log(self, message, *args, level=logging.INFO):
+        """记录日志消息（线程安全），消息按 % 格式延迟拼接"""
+        logger.log(level, message, *args)
     
-    def _update_log(self, message):
-        """更新日志文本框（线程安全）"""
-        self.log_text.config(state=tk.NORMAL)
-        self.log_text.insert(tk.END, message)
-        self.log_text.see(tk.END)
-        self.log_text.config(state=tk.DISABLED)
+    def _drain_log(self):
+        """把缓存的日志一次性写入日志文本框（从主线程调用）"""
+        pending = self.log_handler.pending
+        if pending:
+            lines = []
+            while pending:
+                lines.append(pending.popleft())
+            self.log_text.config(state=tk.NORMAL)
+            self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+            self.log_text.see(tk.END)
+            self.log_text.config(state=tk.DISABLED)
+        self.root.after(LOG_POLL_INTERVAL_MS, self._drain_log)
     
     def _update_status(self, status):
         """更新状态标签（线程安全）"""
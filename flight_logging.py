@@ -0,0 +1,86 @@
+"""命令行版本与图形界面共用的日志配置
+
+- 文件日志使用 JSON Lines 格式，按大小轮转
+- 调用方只把日志记录放入队列，写文件和控制台输出都在后台线程完成
+- 日志级别通过环境变量 FLIGHT_ALERT_LOG_LEVEL 设置（默认 INFO），
+  低于该级别的日志在构造消息字符串之前就会被丢弃
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime
+
+LOG_LEVEL_ENV = "FLIGHT_ALERT_LOG_LEVEL"
+LOG_FILE_NAME = "flight_alert.log"
+LOG_MAX_BYTES = 5 * 1024 * 1024  # 单个日志文件上限 5MB
+LOG_BACKUP_COUNT = 3
+CONSOLE_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# LogRecord 自带的属性，其余属性视为通过 extra 传入的结构化字段
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON，extra 中的字段会原样写入"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def resolve_level(default=logging.INFO):
+    """从环境变量读取日志级别，无效值时使用默认级别"""
+    level = logging.getLevelName(os.getenv(LOG_LEVEL_ENV, "").strip().upper())
+    return level if isinstance(level, int) else default
+
+
+def setup_logging(log_dir, level=None, console=True, extra_handlers=()):
+    """配置根日志记录器，返回已启动的 QueueListener（程序退出时自动停止）"""
+    if level is None:
+        level = resolve_level()
+
+    os.makedirs(log_dir, exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(log_dir, LOG_FILE_NAME),
+        maxBytes=LOG_MAX_BYTES,
+        backupCount=LOG_BACKUP_COUNT,
+        encoding='utf-8'
+    )
+    file_handler.setFormatter(JsonLinesFormatter())
+    handlers = [file_handler]
+
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        handlers.append(console_handler)
+
+    handlers.extend(extra_handlers)
+
+    log_queue = queue.Queue(-1)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    # 通过级别检查的记录在入队时格式化一次，后台的各个处理器不再重复拼接消息
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener.start()
+    # 退出前处理完队列中剩余的日志
+    atexit.register(listener.stop)
+    return listener
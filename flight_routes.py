@@ -0,0 +1,62 @@
+"""出发地/目的地机场组的航线展开与最低价汇总
+
+placeFrom / placeTo 既可以是单个机场代码，也可以是逗号分隔的字符串或列表，
+例如 "KWE,ZYI,TEN" 表示贵州省内任一机场出发。监控时会查询所有
+出发地×目的地组合，并按日期取所有组合中的最低价作为这一组的价格。
+"""
+
+BASE_URL = "https://flights.ctrip.com/itinerary/api/12808/lowestPrice?"
+
+
+def parse_airports(value):
+    """把机场代码配置统一成去重后的大写代码列表，保持原有顺序"""
+    if isinstance(value, str):
+        value = value.split(",")
+    airports = []
+    for code in value:
+        code = code.strip().upper()
+        if code and code not in airports:
+            airports.append(code)
+    return airports
+
+
+def route_pairs(origins, destinations):
+    """展开所有出发地×目的地组合，跳过出发地与目的地相同的组合"""
+    return [(origin, destination) for origin in origins for destination in destinations if origin != destination]
+
+
+def route_url(flight_way, origin, destination, direct):
+    """构造携程最低价接口的请求地址"""
+    url = f'{BASE_URL}flightWay={flight_way}&dcity={origin}&acity={destination}'
+    if direct:
+        url += '&direct=true'
+    return url + '&army=false'
+
+
+def format_route(route):
+    return f"{route[0]}→{route[1]}"
+
+
+def extract_prices(data):
+    """从接口响应中取出 {日期: 价格}，数据缺失时返回空字典"""
+    if not data or data.get("status") == 2 or not data.get("data") or not data["data"].get("oneWayPrice"):
+        return {}
+    return data["data"]["oneWayPrice"][0]  # 假设总是第一个元素
+
+
+def cheapest_by_date(route_prices, dates):
+    """遍历一次所有航线，按日期维护当前最低价
+
+    route_prices 为 {(出发地, 目的地): {日期: 价格}}，
+    返回 {日期: (最低价格, (出发地, 目的地))}，没有任何航线有价格的日期不出现在结果中。
+    """
+    cheapest = {}
+    for route, prices in route_prices.items():
+        for date in dates:
+            price = prices.get(date)
+            if price is None:
+                continue
+            best = cheapest.get(date)
+            if best is None or (price, route) < best:
+                cheapest[date] = (price, route)
+    return cheapest